@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 import json
+import queue
+import threading
 from pathlib import Path
-from collections import Counter
 
+import numpy as np
 import cv2
 
+from rollout_io import iter_frames, load_steps, step_mask
+
 # Change this to your latest rollout folder if needed
 # e.g. data/teleop/20260225_142233
 ROLLOUT_DIR = None  # auto-pick newest if None
 
+PREFETCH = 64  # decoded frames buffered ahead of the replay window
+
+_END = object()
+
 
 def newest_rollout_dir(base="data/teleop") -> Path:
     base = Path(base)
@@ -18,12 +26,27 @@ def newest_rollout_dir(base="data/teleop") -> Path:
     return runs[-1]
 
 
+def _prefetch(frames, q: queue.Queue, errors: list):
+    """Decode frames on a background thread so the replay loop only blocks on waitKey.
+
+    Always ends with _END, even if decoding raises; the exception goes to `errors`
+    for main() to re-raise.
+    """
+    try:
+        for img in frames:
+            q.put(img)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        q.put(_END)
+
+
 def main():
     roll_dir = newest_rollout_dir() if ROLLOUT_DIR is None else Path(ROLLOUT_DIR)
     meta_path = roll_dir / "rollout.json"
     meta = json.loads(meta_path.read_text(encoding="utf-8"))
 
-    steps = meta["steps"]
+    steps = load_steps(roll_dir, meta)
     keymap = meta["keymap"]
     names = [k["name"] for k in keymap]
 
@@ -32,33 +55,35 @@ def main():
     print(f"Hz: {meta['hz']}")
     print(f"Action dims: {len(names)} -> {names}")
 
-    # Count how often each action bit is ON
-    on_counts = Counter()
-    combos = Counter()
-    for s in steps:
-        a = s["action"]
-        for i, v in enumerate(a):
-            if v == 1:
-                on_counts[names[i]] += 1
-        combos[tuple(a)] += 1
+    # One bitmask per step (bit i = names[i]); all counting below runs in numpy
+    masks = np.fromiter((step_mask(s) for s in steps), dtype=np.uint32, count=len(steps))
 
+    # Count how often each action bit is ON
     print("\nAction ON counts:")
-    for n in names:
-        print(f"  {n:12s}: {on_counts[n]} ({on_counts[n]/len(steps):.1%})")
+    for i, n in enumerate(names):
+        on = int(np.count_nonzero(masks & (1 << i)))
+        print(f"  {n:12s}: {on} ({on/len(steps):.1%})")
 
+    combos, counts = np.unique(masks, return_counts=True)
     print(f"\nUnique action combos: {len(combos)} (top 10)")
-    for combo, c in combos.most_common(10):
-        pretty = [names[i] for i,v in enumerate(combo) if v==1]
-        print(f"  {c:4d}  {pretty if pretty else ['noop']}")
+    for j in np.argsort(-counts, kind="stable")[:10]:
+        pretty = [names[i] for i in range(len(names)) if (combos[j] >> i) & 1]
+        print(f"  {counts[j]:4d}  {pretty if pretty else ['noop']}")
 
     # Replay a quick preview
     print("\nReplaying (press ESC to quit)...")
-    for s in steps:
-        img = cv2.imread(str(roll_dir / s["frame"]))
+    frames_q = queue.Queue(maxsize=PREFETCH)
+    errors = []
+    threading.Thread(target=_prefetch, args=(iter_frames(roll_dir, meta, steps), frames_q, errors),
+                     daemon=True).start()
+    for mask in masks:
+        img = frames_q.get()
+        if img is _END:
+            break
         if img is None:
             continue
         # overlay active actions
-        active = [names[i] for i,v in enumerate(s["action"]) if v==1]
+        active = [names[i] for i in range(len(names)) if (mask >> i) & 1]
         txt = ", ".join(active) if active else "noop"
         cv2.putText(img, txt, (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255,255,255), 2)
         cv2.imshow("teleop_replay", img)
@@ -67,6 +92,9 @@ def main():
 
     cv2.destroyAllWindows()
 
+    if errors:
+        raise errors[0]
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Helpers for reading teleop rollouts written by teleop_record.py.
+
+Steps are streamed as msgpack records to meta["steps_file"]; older rollouts
+keep them inline in rollout.json under meta["steps"].
+A rollout stores its frames either as one JPEG per step (steps[i]["frame"])
+or as a single video file (meta["video"]) where frame i belongs to steps[i].
+Actions are stored as an int bitmask (steps[i]["action_mask"], bit j = keymap[j]);
+older rollouts store the expanded multi-hot list in steps[i]["action"].
+"""
+
+from pathlib import Path
+
+import cv2
+import msgpack
+
+
+def load_steps(roll_dir: Path, meta: dict) -> list[dict]:
+    """Per-step records of a rollout, in order."""
+    if "steps_file" not in meta:
+        return meta["steps"]
+    with open(roll_dir / meta["steps_file"], "rb") as f:
+        # a truncated last record (recorder killed mid-write) is simply dropped
+        return list(msgpack.Unpacker(f, raw=False))
+
+
+def step_mask(step: dict) -> int:
+    """Action bitmask for one step (bit j = keymap[j])."""
+    if "action_mask" in step:
+        return step["action_mask"]
+    return sum(v << i for i, v in enumerate(step["action"]))
+
+
+def step_action(step: dict, n: int) -> list[int]:
+    """Multi-hot action vector of length n for one step."""
+    if "action" in step:
+        return step["action"]
+    mask = step["action_mask"]
+    return [(mask >> i) & 1 for i in range(n)]
+
+
+def read_video(path: Path):
+    """Decode a video file linearly, yielding BGR uint8 frames."""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Could not open video {path}")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def iter_frames(roll_dir: Path, meta: dict, steps: list):
+    """Yield one BGR frame per step (None if a JPEG is missing/unreadable)."""
+    if "video" in meta:
+        yield from read_video(roll_dir / meta["video"])
+    else:
+        for s in steps:
+            yield cv2.imread(str(roll_dir / s["frame"]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Screen capture backends shared by the recorder scripts.
+
+- Windows: DXGI Desktop Duplication via dxcam (frames arrive as BGR, no GDI BitBlt)
+- Linux/macOS: mss fallback
+
+Usage:
+    ticker = Ticker(HZ)
+    with Capture(REGION, hz=HZ) as cap:
+        ticker.start()
+        while ...:
+            frame = cap.grab()  # HxWxC uint8, BGR (dxcam) or BGRA (mss)
+            downscale(frame, obs)  # obs: preallocated HxWx3 uint8
+            t_unix = ticker.now_unix()
+            ticker.wait()
+"""
+
+import sys
+import time
+
+import numpy as np
+import cv2
+import mss
+
+if sys.platform == "win32":
+    import dxcam
+
+
+class Capture:
+    """Grab a fixed screen region as a uint8 frame with `channels` channels.
+
+    dxcam frames are BGR; mss frames are left as BGRA so callers can drop the
+    alpha channel after downscaling instead of converting the full-size frame.
+    The returned array stays valid for a few more grabs (dxcam hands out slots of
+    its frame ring buffer; mss allocates a new one each time), which is enough to
+    pass it through a short queue. Copy it if you keep it around longer.
+    """
+
+    def __init__(self, region: dict, hz: int = 10, backend: str | None = None):
+        # backend="mss" forces the mss path, e.g. for regions given in virtual-desktop
+        # coordinates on a non-primary monitor (dxcam only sees output 0 here)
+        self.region = region
+        self.hz = hz
+        self.backend = backend or ("dxcam" if sys.platform == "win32" else "mss")
+        self.channels = 3 if self.backend == "dxcam" else 4
+        self._camera = None
+        self._sct = None
+
+    def __enter__(self):
+        if self.backend == "dxcam":
+            # dxcam wants (left, top, right, bottom) relative to the output (monitor 0)
+            r = self.region
+            box = (r["left"], r["top"], r["left"] + r["width"], r["top"] + r["height"])
+            self._camera = dxcam.create(output_idx=0, output_color="BGR")
+            # video_mode repeats the last frame when the screen is static,
+            # so get_latest_frame() never blocks waiting for a change
+            self._camera.start(region=box, target_fps=self.hz, video_mode=True)
+        else:
+            self._sct = mss.mss()
+        return self
+
+    def __exit__(self, *exc):
+        if self._camera is not None:
+            self._camera.stop()
+            del self._camera
+            self._camera = None
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+    def grab(self) -> np.ndarray:
+        if self._camera is not None:
+            return self._camera.get_latest_frame()  # already HxWx3 BGR
+
+        raw = self._sct.grab(self.region)  # BGRA
+        # alias the mss buffer instead of copying it into a fresh array
+        return np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+
+
+class Ticker:
+    """Fixed-rate loop pacing plus step timestamps on the monotonic clock.
+
+    Tick k is due at start + k*dt, so sleep overshoot doesn't accumulate into
+    drift over long recordings. Timestamps come from the same clock, anchored
+    to wall time once (start_unix) when the Ticker is created.
+    """
+
+    def __init__(self, hz: int):
+        self.dt = 1.0 / hz
+        self.start_unix = time.time()
+        self._start_ns = time.monotonic_ns()
+        self._deadline = time.monotonic()
+
+    def start(self):
+        """(Re)start the schedule now, e.g. once capture setup is done."""
+        self._deadline = time.monotonic()
+
+    def now_unix(self) -> float:
+        return self.start_unix + (time.monotonic_ns() - self._start_ns) / 1e9
+
+    def wait(self):
+        """Sleep until the next tick is due."""
+        self._deadline += self.dt
+        sleep_for = self._deadline - time.monotonic()
+        if sleep_for > 0:
+            time.sleep(sleep_for)
+        elif sleep_for < -self.dt:
+            self._deadline = time.monotonic()  # fell more than a tick behind: resync, don't burst
+
+
+def downscale(frame: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Downscale a BGR/BGRA frame into dst (HxWx3 BGR), dropping alpha if present.
+
+    Exact integer ratios (1280x720 -> 320x180) just take every k-th pixel, a single
+    strided copy; other sizes fall back to INTER_AREA.
+    """
+    h, w = frame.shape[:2]
+    out_h, out_w = dst.shape[:2]
+    if h % out_h == 0 and w % out_w == 0:
+        np.copyto(dst, frame[::h // out_h, ::w // out_w, :3])
+    else:
+        small = cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA)
+        np.copyto(dst, small[:, :, :3])
+    return dst
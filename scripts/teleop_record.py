@@ -14,19 +14,27 @@ How to use:
 
 Notes:
 - No preview window is shown (avoids stealing focus).
-- Data is saved under data/teleop/<timestamp>/.
+- Data is saved under data/teleop/<timestamp>/: rollout.json (header) + steps.mpk
+  (one msgpack record per step).
+- Each step stores its action as an int bitmask (bit i = KEYMAP[i]).
+- With SAVE_VIDEO, frames go to video.mkv and frame i belongs to steps[i].
 """
 
 import time
-import json
+import queue
 import threading
 from pathlib import Path
 
 import numpy as np
 import cv2
-import mss
+import imageio
+import msgpack
+import orjson
+import simplejpeg
 from pynput import keyboard
 
+from screen_capture import Capture, Ticker, downscale
+
 
 # ---- Your fixed capture region (already set in your project scripts) ----
 REGION = {"left": 320, "top": 212, "width": 1280, "height": 720}
@@ -37,7 +45,16 @@ OUT_W, OUT_H = 320, 180
 # ---- Recording settings ----
 HZ = 10          # 10 Hz is a nice default for teleop (try 5 or 10)
 N_STEPS_MAX = 10_000  # safety cap (~1000s at 10 Hz)
-JPEG_QUALITY = 90
+JPEG_QUALITY = 75   # 320x180 frames for a small CNN; higher mostly buys bytes + encode time
+USE_WEBP = False    # True: frames/*.webp instead of JPEG
+WEBP_QUALITY = 80   # 101 = lossless
+SAVE_VIDEO = False  # True: one lossless video.mkv (ffv1) instead of an image per step
+
+# ---- Pipeline ----
+# capture (main thread) -> resize thread -> encode thread, with bounded queues between.
+# If encoding falls behind, the queues fill up and new captures are dropped
+# instead of piling up in RAM.
+QUEUE_SIZE = 2
 
 # ---- Keys to record (customize to your bindings) ----
 # We'll record these as a multi-hot vector each timestep.
@@ -59,37 +76,123 @@ KEYMAP = [
 # (This script is keyboard-only; mouse buttons won't be captured unless you add a mouse listener.)
 
 
+# Special (non-character) keys -> names. pynput doesn't always distinguish
+# left/right shift; Key.shift is treated as left_shift, good enough for now.
+# You can add more mappings here if needed.
+_SPECIAL = {
+    keyboard.Key.up: "up",
+    keyboard.Key.down: "down",
+    keyboard.Key.left: "left",
+    keyboard.Key.right: "right",
+    keyboard.Key.esc: "esc",
+    keyboard.Key.enter: "enter",
+    keyboard.Key.tab: "tab",
+    keyboard.Key.shift: "left_shift",
+    keyboard.Key.shift_r: "right_shift",
+}
+
+
 def _key_to_name(key) -> str | None:
     """Convert pynput key to a simple string name."""
-    # Character keys
-    try:
-        if key.char is not None:
-            return key.char.lower()
-    except Exception:
-        pass
+    name = _SPECIAL.get(key)
+    if name is not None:
+        return name
+
+    # Character keys (KeyCode.char may be None for dead/unmapped keys)
+    char = getattr(key, "char", None)
+    return char.lower() if char is not None else None
+
+
+def _write_jpeg(path: Path, img: np.ndarray):
+    """Encode a contiguous BGR frame to JPEG and write it to disk."""
+    # fastdct = libjpeg-turbo integer DCT; 4:2:0 matches what cv2.imwrite produced
+    buf = simplejpeg.encode_jpeg(img, quality=JPEG_QUALITY, colorspace="BGR",
+                                 colorsubsampling="420", fastdct=True)
+    path.write_bytes(buf)
 
-    # Special keys
-    if key == keyboard.Key.up:
-        return "up"
-    if key == keyboard.Key.down:
-        return "down"
-    if key == keyboard.Key.left:
-        return "left"
-    if key == keyboard.Key.right:
-        return "right"
-    if key == keyboard.Key.esc:
-        return "esc"
-    if key == keyboard.Key.enter:
-        return "enter"
-    if key == keyboard.Key.tab:
-        return "tab"
-    if key == keyboard.Key.shift:
-        return "left_shift"  # pynput doesn't always distinguish; good enough for now
-    if key == keyboard.Key.shift_r:
-        return "right_shift"
-
-    # You can add more mappings here if needed
-    return None
+
+def _write_webp(path: Path, img: np.ndarray):
+    ok, buf = cv2.imencode(".webp", img, [int(cv2.IMWRITE_WEBP_QUALITY), WEBP_QUALITY])
+    if not ok:
+        raise RuntimeError(f"WebP encode failed for {path}")
+    path.write_bytes(buf.tobytes())
+
+
+def _append_video(writer, img: np.ndarray):
+    writer.append_data(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))  # imageio expects RGB
+
+
+def _put(q: queue.Queue, item, failed: threading.Event) -> bool:
+    """Blocking put that gives up once any stage has failed (its consumer may be gone)."""
+    while not failed.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q: queue.Queue, failed: threading.Event):
+    """Blocking get; returns None (like the end sentinel) once a stage has failed and q is empty."""
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if failed.is_set():
+                return None
+
+
+def _resize_stage(q_in: queue.Queue, q_out: queue.Queue, failed: threading.Event, errors: list):
+    """Downscale captured frames into a small ring of reused BGR buffers."""
+    # QUEUE_SIZE buffers can sit in q_out and one is being encoded,
+    # so QUEUE_SIZE + 2 guarantees we never overwrite one still in use
+    bufs = [np.empty((OUT_H, OUT_W, 3), dtype=np.uint8) for _ in range(QUEUE_SIZE + 2)]
+    k = 0
+    try:
+        while True:
+            item = _get(q_in, failed)
+            if item is None:
+                break
+            step, frame = item
+            obs = bufs[k % len(bufs)]
+            k += 1
+            downscale(frame, obs)
+            if not _put(q_out, (step, obs), failed):
+                break
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
+    finally:
+        _put(q_out, None, failed)
+
+
+def _encode_stage(q_in: queue.Queue, out_dir: Path, writer, steps_f,
+                  failed: threading.Event, errors: list):
+    """Write frames and their step records, in capture order."""
+    write = _write_webp if USE_WEBP else _write_jpeg
+    last_flush = time.monotonic()
+    try:
+        while True:
+            item = _get(q_in, failed)
+            if item is None:
+                return
+            step, obs = item
+            if writer is not None:
+                _append_video(writer, obs)
+            else:
+                write(out_dir / step["frame"], obs)
+            # Logged only once its frame is written, so steps.mpk never
+            # refers to a dropped frame (and video frame i stays steps[i])
+            steps_f.write(msgpack.packb(step))
+            # Push buffered records to the OS about once a second, so a killed
+            # recorder loses at most ~1 s of steps
+            if time.monotonic() - last_flush >= 1.0:
+                steps_f.flush()
+                last_flush = time.monotonic()
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
 
 
 def main():
@@ -102,13 +205,29 @@ def main():
     run_id = time.strftime("%Y%m%d_%H%M%S")
     out_dir = Path("data") / "teleop" / run_id
     frames_dir = out_dir / "frames"
-    frames_dir.mkdir(parents=True, exist_ok=True)
-
-    # Shared state for key holds
+    if SAVE_VIDEO:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        frames_dir.mkdir(parents=True, exist_ok=True)
+
+    # alias -> action bit, so a step's action is one int (bit i = KEYMAP[i])
+    alias_to_bit = {alias: 1 << i for i, (_, aliases) in enumerate(KEYMAP) for alias in aliases}
+
+    # Shared state for key holds.
+    # `held` is only touched by the listener thread. After every change it publishes
+    # the OR of the held keys' bits into held_mask[0]; the capture loop just reads
+    # that int (a single atomic load under the GIL, no lock and no copy).
+    # Recomputing from `held` keeps aliases of one action (e.g. w + up) correct.
     held = set()
-    held_lock = threading.Lock()
+    held_mask = [0]
     stop_flag = {"stop": False}
 
+    def _publish():
+        mask = 0
+        for k in held:
+            mask |= alias_to_bit[k]
+        held_mask[0] = mask
+
     def on_press(key):
         name = _key_to_name(key)
         if name is None:
@@ -118,68 +237,94 @@ def main():
             stop_flag["stop"] = True
             return False  # stops the listener
 
-        with held_lock:
+        if name in alias_to_bit and name not in held:
             held.add(name)
+            _publish()
 
     def on_release(key):
         name = _key_to_name(key)
-        if name is None:
-            return
-        with held_lock:
+        if name in held:
             held.discard(name)
+            _publish()
 
     listener = keyboard.Listener(on_press=on_press, on_release=on_release)
     listener.start()
 
+    ticker = Ticker(HZ)
+
     meta = {
         "region": REGION,
         "out_size": [OUT_W, OUT_H],
         "hz": HZ,
         "keymap": [{"name": name, "aliases": sorted(list(aliases))} for name, aliases in KEYMAP],
-        "start_time_unix": time.time(),
-        "steps": [],
+        "start_time_unix": ticker.start_unix,
+        "steps_file": "steps.mpk",
     }
+    if SAVE_VIDEO:
+        meta["video"] = "video.mkv"
+
+    # Header goes out now; steps are streamed to steps.mpk as they happen,
+    # so memory stays flat and a crash leaves a readable rollout minus
+    # the last ~1 s of steps (see the flush in _encode_stage).
+    # The header is tiny, so it stays indented for reading by hand.
+    (out_dir / "rollout.json").write_bytes(orjson.dumps(meta, option=orjson.OPT_INDENT_2))
+    steps_f = open(out_dir / meta["steps_file"], "wb")
+
+    writer = None
+    if SAVE_VIDEO:
+        # bgr0 keeps ffv1 lossless (no yuv420 chroma loss); macro_block_size=1 stops
+        # imageio from padding 180 rows up to a multiple of 16
+        writer = imageio.get_writer(out_dir / meta["video"], fps=HZ, codec="ffv1",
+                                    pixelformat="bgr0", macro_block_size=1)
+    ext = "webp" if USE_WEBP else "jpg"
+
+    q_frames = queue.Queue(maxsize=QUEUE_SIZE)  # capture -> resize
+    q_obs = queue.Queue(maxsize=QUEUE_SIZE)     # resize -> encode
+    # A stage that raises records its exception here and sets `failed`; every
+    # blocking put/get polls it, so the other stages and the capture loop wind down
+    # instead of waiting forever on a dead consumer
+    failed = threading.Event()
+    errors = []
+    stages = [
+        threading.Thread(target=_resize_stage, args=(q_frames, q_obs, failed, errors), daemon=True),
+        threading.Thread(target=_encode_stage,
+                         args=(q_obs, out_dir, writer, steps_f, failed, errors), daemon=True),
+    ]
+    for th in stages:
+        th.start()
+    dropped = 0
+
+    # Capture stays on the main thread: it owns the tick timing (and mss handles
+    # are tied to the thread that created them)
+    with Capture(REGION, hz=HZ) as cap:
+        ticker.start()
 
-    dt = 1.0 / HZ
-
-    with mss.mss() as sct:
         for t in range(N_STEPS_MAX):
-            if stop_flag["stop"]:
+            if stop_flag["stop"] or failed.is_set():
                 break
 
-            step_start = time.time()
-
-            # Capture
-            raw = sct.grab(REGION)  # BGRA
-            frame = np.array(raw, dtype=np.uint8)
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-            obs = cv2.resize(frame_bgr, (OUT_W, OUT_H), interpolation=cv2.INTER_AREA)
-
-            # Snapshot currently held keys
-            with held_lock:
-                held_now = set(held)
-
-            # Convert held keys -> multi-hot action vector based on KEYMAP
-            action_vec = []
-            for _, aliases in KEYMAP:
-                action_vec.append(1 if any(a in held_now for a in aliases) else 0)
-
-            # Save frame
-            frame_path = frames_dir / f"{t:05d}.jpg"
-            cv2.imwrite(str(frame_path), obs, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
-
-            # Log
-            meta["steps"].append({
+            # Capture + snapshot currently held actions
+            frame = cap.grab()
+            step = {
                 "t": t,
-                "time_unix": time.time(),
-                "held_keys": sorted(list(held_now)),
-                "action": action_vec,
-                "frame": f"frames/{t:05d}.jpg",
-            })
+                "time_unix": ticker.now_unix(),
+                "action_mask": held_mask[0],
+            }
+            if not SAVE_VIDEO:
+                step["frame"] = f"frames/{t:05d}.{ext}"
+
+            try:
+                q_frames.put_nowait((step, frame))
+            except queue.Full:
+                dropped += 1
 
             # Timing
-            elapsed = time.time() - step_start
-            time.sleep(max(0.0, dt - elapsed))
+            ticker.wait()
+
+        # Drain the pipeline while the capture (and its frame buffers) is still alive
+        _put(q_frames, None, failed)
+        for th in stages:
+            th.join()
 
     # Ensure listener stops
     try:
@@ -187,9 +332,20 @@ def main():
     except Exception:
         pass
 
-    with open(out_dir / "rollout.json", "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
-
+    steps_f.close()
+    if writer is not None:
+        try:
+            writer.close()
+        except Exception as e:
+            if not errors:
+                raise
+            print(f"(also failed to close video writer: {e!r})")
+
+    if errors:
+        print(f"Recording stopped early; steps up to the failure are in: {out_dir}")
+        raise errors[0]
+    if dropped:
+        print(f"Dropped {dropped} frames (encoder couldn't keep up)")
     print(f"Saved teleop rollout to: {out_dir}")
     print("Done.")
 
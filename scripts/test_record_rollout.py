@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 import time
-import json
 from pathlib import Path
 
 import numpy as np
 import cv2
-import mss
+import orjson
 import pyautogui
 
+from screen_capture import Capture, Ticker, downscale
+
 pyautogui.FAILSAFE = True
 pyautogui.PAUSE = 0.02
 
@@ -49,26 +50,29 @@ def main():
     frames_dir = out_dir / "frames"
     frames_dir.mkdir(parents=True, exist_ok=True)
 
+    ticker = Ticker(HZ)
+
     meta = {
         "region": REGION,
         "out_size": [OUT_W, OUT_H],
         "hz": HZ,
         "n_steps": N_STEPS,
         "actions": [name for name, _ in ACTIONS],
-        "start_time_unix": time.time(),
+        "start_time_unix": ticker.start_unix,
     }
 
-    dt = 1.0 / HZ
+    dt = ticker.dt
 
-    with mss.mss() as sct:
-        for t in range(N_STEPS):
-            step_start = time.time()
+    with Capture(REGION, hz=HZ) as cap:
+        # Preallocated BGR observation buffer, reused every step
+        obs = np.empty((OUT_H, OUT_W, 3), dtype=np.uint8)
 
+        ticker.start()
+
+        for t in range(N_STEPS):
             # Capture
-            raw = sct.grab(REGION)  # BGRA
-            frame = np.array(raw, dtype=np.uint8)
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-            obs = cv2.resize(frame_bgr, (OUT_W, OUT_H), interpolation=cv2.INTER_AREA)
+            frame = cap.grab()
+            downscale(frame, obs)
 
             # Choose an action (for now: deterministic demo pattern)
             # e.g., move right for 10 steps, then noop
@@ -88,7 +92,7 @@ def main():
                 "t": t,
                 "action_index": a_idx,
                 "action_name": a_name,
-                "time_unix": time.time(),
+                "time_unix": ticker.now_unix(),
                 "frame": f"frames/{t:05d}.jpg",
             }
             meta.setdefault("steps", []).append(meta_step)
@@ -105,16 +109,13 @@ def main():
                 # Hold key for half the timestep; tune later.
                 press_key(a_key, duration=dt * 0.5)
 
-            # Keep timing roughly consistent
-            elapsed = time.time() - step_start
-            sleep_for = max(0.0, dt - elapsed)
-            time.sleep(sleep_for)
+            # Timing
+            ticker.wait()
 
     cv2.destroyAllWindows()
 
     # Save metadata
-    with open(out_dir / "rollout.json", "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
+    (out_dir / "rollout.json").write_bytes(orjson.dumps(meta))
 
     print(f"Saved rollout to: {out_dir}")
 
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Stage 1 plumbing:
-- Capture a region of the screen (fast) using mss
+- Capture a region of the screen (fast) using dxcam on Windows, mss elsewhere
 - Optionally preview it with OpenCV
 - Send a short keypress sequence to the active window
 
@@ -13,11 +13,12 @@ Usage:
 """
 
 import time
-import numpy as np
 import cv2
 import mss
 import pyautogui
 
+from screen_capture import Capture
+
 # Safety: prevents runaway automation if something goes wrong
 pyautogui.FAILSAFE = True
 pyautogui.PAUSE = 0.02
@@ -43,25 +44,26 @@ def main():
     print("PyAutoGUI failsafe is ON: move mouse to top-left corner to abort.")
     time.sleep(2.0)
 
-    with mss.mss() as sct:
-        if CAPTURE_FULL_MONITOR:
+    if CAPTURE_FULL_MONITOR:
+        with mss.mss() as sct:
             monitor = sct.monitors[MONITOR_INDEX]
-            bbox = {
-                "left": monitor["left"],
-                "top": monitor["top"],
-                "width": monitor["width"],
-                "height": monitor["height"],
-            }
-        else:
-            bbox = REGION
-
-        print(f"Capturing region: {bbox}")
-
+        bbox = {
+            "left": monitor["left"],
+            "top": monitor["top"],
+            "width": monitor["width"],
+            "height": monitor["height"],
+        }
+    else:
+        bbox = REGION
+
+    print(f"Capturing region: {bbox}")
+
+    # mss monitor boxes are virtual-desktop coordinates, which dxcam (primary output
+    # only) can't address for other monitors, so full-monitor capture stays on mss
+    with Capture(bbox, backend="mss" if CAPTURE_FULL_MONITOR else None) as cap:
         # Grab one frame to confirm capture works
-        raw = sct.grab(bbox)  # BGRA
-        frame = np.array(raw, dtype=np.uint8)
-        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-        frame_small = cv2.resize(frame_bgr, (320,180), interpolation=cv2.INTER_AREA)
+        frame = cap.grab()
+        frame_small = cv2.resize(frame, (320,180), interpolation=cv2.INTER_AREA)[:, :, :3]
 
         # Show preview window (press q to close)
         cv2.imshow("capture_preview (press ESC)", frame_small)
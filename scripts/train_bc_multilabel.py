@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
+import importlib.util
 import json
+import math
 from pathlib import Path
 
+import cv2
 import torch
 import torch.nn as nn
 from torch.utils.data import Dataset, DataLoader
-from torchvision.transforms import functional as TF
-from PIL import Image
+from torchvision.io import ImageReadMode, decode_jpeg, read_file
+
+from rollout_io import load_steps, read_video, step_action
+
+# torch.compile the model when training on CUDA. Inductor needs Triton, which stock
+# PyTorch on Windows doesn't ship, so by default this is on only where Triton is installed.
+COMPILE = importlib.util.find_spec("triton") is not None
 
 # Auto-pick newest rollout
 def newest_rollout_dir(base="data/teleop") -> Path:
@@ -17,25 +25,89 @@ def newest_rollout_dir(base="data/teleop") -> Path:
     return runs[-1]
 
 
+def _to_rgb_chw(bgr) -> torch.Tensor:
+    """OpenCV HxWx3 BGR uint8 -> [3,H,W] RGB uint8 tensor."""
+    return torch.from_numpy(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)).permute(2, 0, 1)
+
+
 class TeleopDataset(Dataset):
     def __init__(self, rollout_dir: Path):
         meta = json.loads((rollout_dir / "rollout.json").read_text(encoding="utf-8"))
         self.rollout_dir = rollout_dir
-        self.steps = meta["steps"]
+        self.steps = load_steps(rollout_dir, meta)
         self.action_dim = len(meta["keymap"])
 
+        # Video rollouts are decoded once up front; seeking per item is slow
+        self.frames = None
+        if "video" in meta:
+            self.frames = [_to_rgb_chw(f) for f in read_video(rollout_dir / meta["video"])]
+
     def __len__(self):
         return len(self.steps)
 
     def __getitem__(self, idx):
+        # x is either the raw JPEG bytes (1-D uint8) or, for video/WebP rollouts, an
+        # already decoded [3,H,W] uint8 frame. JPEGs are decoded batch-wise in to_batch().
         s = self.steps[idx]
-        img_path = self.rollout_dir / s["frame"]
-        img = Image.open(img_path).convert("RGB")  # 320x180
-        x = TF.to_tensor(img)  # [3,H,W], float in [0,1]
-        y = torch.tensor(s["action"], dtype=torch.float32)  # multi-hot
+        if self.frames is not None:
+            x = self.frames[idx]
+        elif s["frame"].endswith(".jpg"):
+            x = read_file(str(self.rollout_dir / s["frame"]))
+        else:
+            x = _to_rgb_chw(cv2.imread(str(self.rollout_dir / s["frame"])))
+        y = torch.tensor(step_action(s, self.action_dim), dtype=torch.float32)  # multi-hot
         return x, y
 
 
+def list_collate(batch):
+    """Keep x as a list (JPEG byte strings differ in length), stack y."""
+    xs, ys = zip(*batch)
+    return list(xs), torch.stack(ys)
+
+
+def to_batch(xs: list, device: str) -> torch.Tensor:
+    """Decode/stack dataset samples into a uint8 [B,3,H,W] batch on device."""
+    if xs[0].dim() == 1:
+        # one batched decode call; on CUDA this runs on nvJPEG
+        return torch.stack(decode_jpeg(xs, mode=ImageReadMode.RGB, device=device))
+    return torch.stack(xs).to(device, non_blocking=True)
+
+
+def load_all(ds: TeleopDataset, device: str):
+    """Decode the whole rollout once into uint8 tensors.
+
+    10k frames at 320x180x3 is ~1.7 GB. The frames go on the GPU only if they fit
+    in half of its free memory (the rest is left for training); otherwise they stay
+    in pinned host memory and each minibatch is copied over asynchronously.
+    Either way every epoch after this does no file reads and no JPEG decode.
+    For video rollouts this releases ds.frames once they've been copied.
+    """
+    # Video rollouts already hold every decoded frame in ds.frames; with spawn-based
+    # workers (Windows) that list would be pickled into each worker, so load in-process
+    num_workers = 0 if ds.frames is not None else 4
+    dl = DataLoader(ds, batch_size=256, shuffle=False, num_workers=num_workers,
+                    collate_fn=list_collate)
+    all_x = None
+    all_y = torch.empty(len(ds), ds.action_dim, dtype=torch.float32)
+    i = 0
+    for xs, y in dl:
+        x = to_batch(xs, device)
+        if all_x is None:
+            shape = (len(ds), *x.shape[1:])
+            on_gpu = device == "cuda" and math.prod(shape) <= torch.cuda.mem_get_info()[0] // 2
+            if on_gpu:
+                all_x = torch.empty(shape, dtype=torch.uint8, device=device)
+            else:
+                all_x = torch.empty(shape, dtype=torch.uint8, pin_memory=device == "cuda")
+        all_x[i:i + len(x)] = x
+        all_y[i:i + len(x)] = y
+        i += len(x)
+    # Video rollouts: all_x now holds every frame, so drop the decoded copy in ds
+    # instead of keeping ~1.7 GB twice (ds can't serve video items after this)
+    ds.frames = None
+    return all_x, all_y.to(device)
+
+
 class SmallCNN(nn.Module):
     def __init__(self, action_dim: int):
         super().__init__()
@@ -58,30 +130,66 @@ class SmallCNN(nn.Module):
 def main():
     rollout_dir = newest_rollout_dir()
     ds = TeleopDataset(rollout_dir)
-    dl = DataLoader(ds, batch_size=64, shuffle=True, num_workers=2, pin_memory=True)
 
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Using device: {device}")
     print(f"Training on: {rollout_dir}  (n={len(ds)})")
 
-    model = SmallCNN(ds.action_dim).to(device)
-    opt = torch.optim.Adam(model.parameters(), lr=1e-3)
+    all_x, all_y = load_all(ds, device)
+    batch_size = 64
+    on_host = all_x.device.type != device
+    if on_host:
+        print(f"Frames kept in {'pinned ' if all_x.is_pinned() else ''}host memory "
+              f"({all_x.numel() / 1e9:.2f} GB)")
+        # Pinned staging buffer, so the per-batch copy to the GPU is truly async.
+        # Reusing it is safe: loss.item() below syncs before the next batch is gathered.
+        staging = torch.empty(batch_size, *all_x.shape[1:], dtype=torch.uint8,
+                              pin_memory=all_x.is_pinned())
+
+    # NHWC + mixed precision lets cuDNN use tensor-core conv kernels on CUDA.
+    # bf16 needs no loss scaling; pre-Ampere GPUs fall back to fp16 + GradScaler.
+    # (Check the compute capability: is_bf16_supported() also counts emulated bf16,
+    # which has no tensor-core kernels on Volta/Turing.)
+    use_amp = device == "cuda"
+    native_bf16 = use_amp and torch.cuda.get_device_capability()[0] >= 8
+    amp_dtype = torch.bfloat16 if native_bf16 else torch.float16
+    scaler = torch.amp.GradScaler("cuda", enabled=use_amp and amp_dtype == torch.float16)
+
+    model = SmallCNN(ds.action_dim).to(device, memory_format=torch.channels_last)
+    # fused=True: one CUDA kernel updates every parameter (CUDA only)
+    opt = torch.optim.Adam(model.parameters(), lr=1e-3, fused=device == "cuda")
     loss_fn = nn.BCEWithLogitsLoss()
 
+    # reduce-overhead = CUDA graphs: the whole small conv stack replays as one launch.
+    # Keep `model` itself uncompiled so the checkpoint has plain state_dict keys.
+    net = model
+    if COMPILE and device == "cuda":
+        net = torch.compile(model, mode="reduce-overhead")
+
     model.train()
     for epoch in range(10):
         total = 0.0
         n = 0
-        for x, y in dl:
-            x = x.to(device)
-            y = y.to(device)
-
-            logits = model(x)
-            loss = loss_fn(logits, y)
+        perm = torch.randperm(len(ds), device=all_x.device)
+        for i in range(0, len(ds), batch_size):
+            idx = perm[i:i + batch_size]
+            if on_host:
+                xb = torch.index_select(all_x, 0, idx, out=staging[:len(idx)])
+                xb = xb.to(device, non_blocking=True)
+                idx = idx.to(device)
+            else:
+                xb = all_x[idx]
+            x = xb.float().mul_(1 / 255.0).contiguous(memory_format=torch.channels_last)
+            y = all_y[idx]
+
+            with torch.autocast(device_type=device, dtype=amp_dtype, enabled=use_amp):
+                logits = net(x)
+                loss = loss_fn(logits, y)
 
             opt.zero_grad()
-            loss.backward()
-            opt.step()
+            scaler.scale(loss).backward()
+            scaler.step(opt)
+            scaler.update()
 
             total += loss.item() * x.size(0)
             n += x.size(0)